@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+answer_cache.py
+
+Semantic answer cache for the Ollama assistant.
+
+  • Entries are keyed on the TF-IDF vector of the question (using the
+    vectorizer loaded by serve_hybrid), the set of chunk IDs the question
+    retrieves and the previous user turn, so a short follow-up is only
+    answered from the cache when it follows the same question.
+  • lookup() returns the answer of the nearest cached question when the
+    cosine similarity and the chunk overlap are both above threshold, so
+    repeated and paraphrased questions skip the LLM call entirely.
+  • The cache is cleared whenever a different index version is serving.
+"""
+
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+import serve_hybrid
+
+SIMILARITY_THRESHOLD = 0.9   # cosine similarity between question vectors
+OVERLAP_THRESHOLD = 0.6      # Jaccard overlap between retrieved chunk sets
+MAX_ENTRIES = 256
+
+def _overlap(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+class AnswerCache:
+    """Nearest-neighbour cache of LLM answers, invalidated on index changes"""
+
+    def __init__(self, similarity_threshold: float = SIMILARITY_THRESHOLD,
+                 overlap_threshold: float = OVERLAP_THRESHOLD,
+                 max_entries: int = MAX_ENTRIES):
+        self.similarity_threshold = similarity_threshold
+        self.overlap_threshold = overlap_threshold
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (context, question) -> (vector, chunk_ids, answer)
+        self.index_version = serve_hybrid.current_index.version
+        self.hits = 0
+        self.misses = 0
+
+    def _check_index(self):
+        version = serve_hybrid.current_index.version
+        if version != self.index_version:
+            self.entries.clear()
+            self.index_version = version
+
+    def _vectorize(self, question: str):
+        return serve_hybrid.current_index.vectorizer.transform([question])
+
+    @staticmethod
+    def _context_key(context: str) -> str:
+        return " ".join(context.lower().split())
+
+    def lookup(self, question: str, chunk_ids: Iterable[str], context: str = "") -> Optional[str]:
+        """Return a cached answer for a similar question asked after the same `context`, or None"""
+        self._check_index()
+        q_vec = self._vectorize(question)
+        chunk_ids = frozenset(chunk_ids)
+        context = self._context_key(context)
+
+        best_key, best_sim = None, self.similarity_threshold
+        if q_vec.nnz:
+            for key, (vec, cached_ids, _) in self.entries.items():
+                if key[0] != context:
+                    continue
+                # TF-IDF rows are L2-normalised, so the dot product is the cosine
+                sim = q_vec.multiply(vec).sum()
+                if sim >= best_sim and _overlap(chunk_ids, cached_ids) >= self.overlap_threshold:
+                    best_key, best_sim = key, sim
+
+        if best_key is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(best_key)
+        return self.entries[best_key][2]
+
+    def store(self, question: str, chunk_ids: Iterable[str], answer: str, context: str = ""):
+        """Cache the answer to a question asked after `context` (the previous user turn)"""
+        q_vec = self._vectorize(question)
+        if not q_vec.nnz:
+            # No known terms: nothing meaningful to match against later
+            return
+        key = (self._context_key(context), question)
+        self.entries[key] = (q_vec, frozenset(chunk_ids), answer)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+benchmark.py
+
+End-to-end benchmark of the search pipeline on synthetic corpora.
+
+  • Generates page JSONs in the shape extract_json.py writes, with text in the
+    style of hybrid_poc.py's sample chunks (signal IDs, ECO IDs, dotted
+    section numbers), at any size (e.g. 10k … 1M pages/chunks).
+  • Runs build_chunks.py → build_embeddings.py → build_graph.py as separate
+    processes and records wall time, throughput and peak RSS per stage.
+  • Loads serve_hybrid in a fresh process and measures query latency
+    (p50/p95/p99) and QPS.
+  • Compares the run against a stored baseline and exits non-zero when any
+    metric regresses by more than the tolerance.
+
+Usage:
+    python benchmark.py --sizes 10000 100000
+    python benchmark.py --sizes 10000 --save-baseline
+    python benchmark.py --sizes 10000 --baseline benchmark_baseline.json
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent
+DEFAULT_BASELINE = REPO_DIR / "benchmark_baseline.json"
+
+BUILD_STAGES = ["build_chunks.py", "build_embeddings.py", "build_graph.py"]
+WORDS_PER_PAGE = 80
+NUM_QUERIES = 200
+
+# Vocabulary in the style of the hybrid_poc.py sample chunks
+BASE_WORDS = (
+    "initialization reset default oil change flag cold start enrichment ignition "
+    "advance retarded coolant temperature service indicator engages dash warning "
+    "fuel trim table reference adjustments calibration maps clear maintenance "
+    "notify driver engine enrich timing correction applied reminder triggers tool "
+    "boost control map overboost prevention signal monitored drift observed "
+    "mapping recalibration load threshold rpm sensor torque throttle lambda "
+    "injector pressure request limit base value status counter diagnosis"
+).split()
+SIGNAL_PREFIXES = ["LV", "IGNITION", "AFR", "FUEL", "BOOST", "TQ", "N", "MAF", "TCO", "PUT"]
+SIGNAL_PARTS = ["ER", "BAL", "HOM", "REQ", "OIL", "CHG", "CAN", "ADVANCE", "TARGET",
+                "TRIM", "LIMIT", "SP", "MAX", "MIN", "ACT", "COR", "DIF", "FIL"]
+
+# ---------------------------------------------------------------- corpus ----
+
+def make_vocabulary(rng: random.Random, size: int = 20000):
+    """Base words plus synthetic calibration terms, with Zipf-like weights"""
+    words = list(BASE_WORDS)
+    while len(words) < size:
+        words.append(f"{rng.choice(BASE_WORDS)}_{rng.choice(['map', 'tab', 'cor', 'fac', 'ofs'])}{len(words)}")
+    cum_weights, total = [], 0.0
+    for rank in range(1, len(words) + 1):
+        total += 1.0 / rank
+        cum_weights.append(total)
+    return words, cum_weights
+
+def make_signals(rng: random.Random, count: int):
+    signals = set()
+    while len(signals) < count:
+        parts = rng.sample(SIGNAL_PARTS, rng.randint(2, 3))
+        signals.add("_".join([rng.choice(SIGNAL_PREFIXES)] + parts))
+    return sorted(signals)
+
+def make_section(rng: random.Random) -> str:
+    depth = rng.randint(2, 7)
+    return ".".join(str(rng.randint(1, 99 if i == 0 else 12)) for i in range(depth))
+
+def generate_corpus(out_dir: Path, num_pages: int, seed: int = 42):
+    """Write num_pages page_*.json files as extract_json.py would"""
+    rng = random.Random(seed)
+    words, cum_weights = make_vocabulary(rng)
+    signals = make_signals(rng, max(100, num_pages // 50))
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    for page_num in range(1, num_pages + 1):
+        body = rng.choices(words, cum_weights=cum_weights, k=WORDS_PER_PAGE)
+        for sig in rng.sample(signals, rng.randint(1, 3)):
+            body.insert(rng.randrange(len(body)), sig)
+        for _ in range(rng.randint(0, 2)):
+            body.insert(rng.randrange(len(body)), f"ECO-{rng.randint(1, 999):04d}")
+
+        lines = [f"{make_section(rng)} {' '.join(body[:6])}"]
+        lines += [" ".join(body[i:i + 12]) for i in range(6, len(body), 12)]
+        page = {
+            "page_number": page_num,
+            "blocks": [{"type": 0, "lines": [{"spans": [{"text": line}]} for line in lines]}],
+            "images": [],
+        }
+        with open(out_dir / f"page_{page_num:05d}.json", "w", encoding="utf-8") as f:
+            json.dump(page, f)
+
+    return make_queries(rng, words, cum_weights, signals)
+
+def make_queries(rng: random.Random, words, cum_weights, signals, count: int = NUM_QUERIES):
+    queries = []
+    for _ in range(count):
+        terms = rng.choices(words[:2000], cum_weights=cum_weights[:2000], k=rng.randint(2, 5))
+        if rng.random() < 0.5:
+            terms.append(rng.choice(signals))
+        queries.append(" ".join(terms))
+    return queries
+
+# -------------------------------------------------------------- measuring ----
+
+def _rss_mb(ru_maxrss: int) -> float:
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    if sys.platform == "darwin":
+        return ru_maxrss / (1024 * 1024)
+    return ru_maxrss / 1024
+
+def run_stage(args, cwd: Path):
+    """Run one stage in its own process; return (seconds, peak RSS MB, output)
+
+    The child is reaped with os.wait4 so the peak RSS is that of the stage
+    alone, not the maximum over every process the benchmark has started.
+    """
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(REPO_DIR), os.environ.get("PYTHONPATH")]))}
+    start = time.perf_counter()
+    proc = subprocess.Popen(args, cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    output = proc.stdout.read()
+    proc.stdout.close()
+    _, status, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    elapsed = time.perf_counter() - start
+    if proc.returncode:
+        raise RuntimeError(f"{' '.join(map(str, args))} failed:\n{output}")
+    return elapsed, _rss_mb(rusage.ru_maxrss), output
+
+QUERY_SCRIPT = """
+import json, sys, time
+load_start = time.perf_counter()
+import serve_hybrid
+load_time = time.perf_counter() - load_start
+queries = json.load(open(sys.argv[1]))
+for q in queries[:10]:
+    serve_hybrid.hybrid_search(q)  # warm-up
+latencies = []
+start = time.perf_counter()
+for q in queries:
+    t0 = time.perf_counter_ns()
+    serve_hybrid.hybrid_search(q)
+    latencies.append(time.perf_counter_ns() - t0)
+elapsed = time.perf_counter() - start
+latencies.sort()
+pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] / 1e6
+print(json.dumps({
+    "load_seconds": load_time,
+    "queries": len(queries),
+    "qps": len(queries) / elapsed,
+    "p50_ms": pct(0.50),
+    "p95_ms": pct(0.95),
+    "p99_ms": pct(0.99),
+}))
+"""
+
+def benchmark_size(num_chunks: int, work_dir: Path, seed: int):
+    print(f"\n=== {num_chunks} chunks ===")
+    result = {"chunks": num_chunks, "stages": {}}
+
+    start = time.perf_counter()
+    queries = generate_corpus(work_dir / "data" / "pdf_extracted", num_chunks, seed)
+    print(f"  generate corpus: {time.perf_counter() - start:.2f}s")
+    queries_path = work_dir / "bench_queries.json"
+    queries_path.write_text(json.dumps(queries), encoding="utf-8")
+
+    for script in BUILD_STAGES:
+        seconds, rss, _ = run_stage([sys.executable, str(REPO_DIR / script)], work_dir)
+        stage = script[:-3]
+        result["stages"][stage] = {
+            "seconds": seconds,
+            "chunks_per_second": num_chunks / seconds,
+            "peak_rss_mb": rss,
+        }
+        print(f"  {stage}: {seconds:.2f}s, {num_chunks / seconds:.0f} chunks/s, peak RSS {rss:.0f} MB")
+
+    query_args = [sys.executable, "-c", QUERY_SCRIPT, str(queries_path)]
+    _, rss, output = run_stage(query_args, work_dir)
+    serve = json.loads(output.strip().splitlines()[-1])
+    serve["peak_rss_mb"] = rss
+    result["stages"]["serve_hybrid"] = serve
+    print(f"  serve_hybrid: load {serve['load_seconds']:.2f}s, {serve['qps']:.1f} QPS, "
+          f"p50 {serve['p50_ms']:.2f}ms, p95 {serve['p95_ms']:.2f}ms, p99 {serve['p99_ms']:.2f}ms, "
+          f"peak RSS {rss:.0f} MB")
+    return result
+
+# -------------------------------------------------------------- baseline ----
+
+# metric -> True if higher is better
+COMPARED_METRICS = {
+    "seconds": False,
+    "peak_rss_mb": False,
+    "load_seconds": False,
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "qps": True,
+}
+
+def compare_to_baseline(results, baseline, tolerance: float):
+    """Return a list of human-readable regressions"""
+    regressions = []
+    for size, run in results.items():
+        base_run = baseline.get(size)
+        if not base_run:
+            print(f"\nNo baseline for {size} chunks; skipping comparison")
+            continue
+        for stage, metrics in run["stages"].items():
+            base_metrics = base_run["stages"].get(stage, {})
+            for metric, higher_is_better in COMPARED_METRICS.items():
+                if metric not in metrics or not base_metrics.get(metric):
+                    continue
+                new, old = metrics[metric], base_metrics[metric]
+                change = (new - old) / old
+                worse = -change if higher_is_better else change
+                if worse > tolerance:
+                    regressions.append(
+                        f"{size} chunks / {stage} / {metric}: {old:.4g} → {new:.4g} ({change:+.0%})"
+                    )
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the search pipeline on synthetic corpora")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000],
+                        help="corpus sizes in chunks (default: 10000)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--work-dir", type=Path, default=None,
+                        help="where to build the corpora (default: a temporary directory)")
+    parser.add_argument("--keep", action="store_true", help="keep the generated corpora and artifacts")
+    parser.add_argument("--output", type=Path, default=Path("benchmark_results.json"))
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store this run as the new baseline instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed relative regression per metric (default: 0.2)")
+    args = parser.parse_args()
+
+    root = args.work_dir or Path(tempfile.mkdtemp(prefix="gravdb_bench_"))
+    results = {}
+    try:
+        for size in args.sizes:
+            work_dir = root / f"corpus_{size}"
+            if work_dir.exists():
+                shutil.rmtree(work_dir)
+            work_dir.mkdir(parents=True)
+            results[str(size)] = benchmark_size(size, work_dir, args.seed)
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"\nWrote {args.output}")
+
+    if args.save_baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline.exists() else {}
+        baseline.update(results)
+        args.baseline.write_text(json.dumps(baseline, indent=2), encoding="utf-8")
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+
+    regressions = compare_to_baseline(results, json.loads(args.baseline.read_text(encoding="utf-8")),
+                                      args.tolerance)
+    if regressions:
+        print(f"\nRegressions (> {args.tolerance:.0%} worse than baseline):")
+        for r in regressions:
+            print(f"  • {r}")
+        sys.exit(1)
+    print("\nNo regressions against baseline")
+
+if __name__ == "__main__":
+    main()
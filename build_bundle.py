@@ -0,0 +1,51 @@
+# build_bundle.py
+import hashlib
+import io
+import json
+import pickle
+from pathlib import Path
+from scipy import sparse
+from index_bundle import INDEX_ARTIFACTS, write_bundle
+
+# -------------- Read the artifacts written by build_embeddings / build_graph --------------
+artifacts = {name: Path(name).read_bytes() for name in INDEX_ARTIFACTS}
+
+# -------------- Check that both were built from the same (current) all_chunks.json --------------
+# Each build script writes its *_source.json last, so a rebuild that stopped
+# halfway leaves the hash of the older all_chunks.json behind
+source_hashes = {}
+for sidecar, script in (("embeddings_source.json", "build_embeddings.py"), ("graph_source.json", "build_graph.py")):
+    try:
+        source_hashes[script] = json.loads(Path(sidecar).read_text(encoding="utf-8"))["all_chunks.json"]
+    except (OSError, ValueError, KeyError):
+        raise SystemExit(f"{sidecar} is missing or invalid; rerun {script}")
+if Path("all_chunks.json").exists():
+    source_hashes["all_chunks.json"] = hashlib.sha256(Path("all_chunks.json").read_bytes()).hexdigest()
+if len(set(source_hashes.values())) != 1:
+    stale = ", ".join(f"{name}: {digest[:12]}" for name, digest in source_hashes.items())
+    raise SystemExit(f"Artifacts were built from different versions of all_chunks.json ({stale}); "
+                     "rerun build_embeddings.py and build_graph.py")
+
+# -------------- Check that they belong together before publishing them --------------
+chunk_ids = json.loads(artifacts["chunk_ids.json"])
+tfidf_sparse = sparse.load_npz(io.BytesIO(artifacts["chunk_embeddings_sparse.npz"]))
+vectorizer = pickle.loads(artifacts["vectorizer.pkl"])
+G = pickle.loads(artifacts["graph.pkl"])
+
+if tfidf_sparse.shape[0] != len(chunk_ids):
+    raise SystemExit(f"Matrix has {tfidf_sparse.shape[0]} rows but there are {len(chunk_ids)} chunk IDs")
+if tfidf_sparse.shape[1] != len(vectorizer.vocabulary_):
+    raise SystemExit(f"Matrix has {tfidf_sparse.shape[1]} columns but the vocabulary has {len(vectorizer.vocabulary_)} terms")
+missing = [cid for cid in chunk_ids if cid not in G]
+if missing:
+    raise SystemExit(f"{len(missing)} chunk IDs are not in the graph (e.g. {missing[0]})")
+
+# -------------- Write the bundle and point CURRENT at it --------------
+source = {"all_chunks.json": source_hashes["build_embeddings.py"]}
+
+path = write_bundle(
+    artifacts,
+    counts={"chunks": len(chunk_ids), "features": tfidf_sparse.shape[1], "graph_nodes": G.number_of_nodes()},
+    source=source,
+)
+print(f"Wrote {path} ({len(chunk_ids)} chunks)")
@@ -36,7 +36,7 @@ for page_file in sorted(INPUT_DIR.glob("page_*.json")):
     text_all = " ".join(
         span["text"] for block in data["blocks"] for line in block["lines"] for span in line["spans"]
     )
-    signal_ids = list({s for s in signal_pattern.findall(text_all) if not s.isdigit()})
+    signal_ids = sorted({s for s in signal_pattern.findall(text_all) if not s.isdigit()})
     eco_ids = [f"ECO-{m.group(1)}" for m in eco_pattern.finditer(text_all)]
 
     # 3) All images on this page (we stored them in page JSON)
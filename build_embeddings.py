@@ -1,4 +1,5 @@
 # build_embeddings.py
+import hashlib
 import json
 import pickle
 from pathlib import Path
@@ -6,8 +7,8 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 from scipy import sparse
 
 # -------------- Load all_chunks.json --------------
-with open("all_chunks.json", "r", encoding="utf-8") as f:
-    all_chunks = json.load(f)
+chunks_bytes = Path("all_chunks.json").read_bytes()
+all_chunks = json.loads(chunks_bytes)
 
 texts = [c["text"] for c in all_chunks]
 chunk_ids = [c["chunk_id"] for c in all_chunks]
@@ -18,6 +19,12 @@ vectorizer = TfidfVectorizer(max_df=0.85, min_df=2)
 tfidf_sparse = vectorizer.fit_transform(texts)  
 # tfidf_sparse shape: (N_chunks, N_features) but stored as sparse
 
+# Keep vectorizer.pkl byte-for-byte reproducible (and small): stop_words_
+# (the pruned terms, a set) is only kept for introspection, and
+# _stop_words_id is a memory address sklearn only uses as a cache key
+vectorizer.stop_words_ = None
+vars(vectorizer).pop("_stop_words_id", None)
+
 # -------------- Persist vectorizer and sparse matrix --------------
 with open("vectorizer.pkl", "wb") as f:
     pickle.dump(vectorizer, f)
@@ -28,5 +35,9 @@ sparse.save_npz("chunk_embeddings_sparse.npz", tfidf_sparse)
 with open("chunk_ids.json", "w", encoding="utf-8") as f:
     json.dump(chunk_ids, f)
 
-print("Wrote vectorizer.pkl, chunk_embeddings_sparse.npz, chunk_ids.json")
+# -------------- Record which all_chunks.json these were built from (written last) --------------
+with open("embeddings_source.json", "w", encoding="utf-8") as f:
+    json.dump({"all_chunks.json": hashlib.sha256(chunks_bytes).hexdigest()}, f)
+
+print("Wrote vectorizer.pkl, chunk_embeddings_sparse.npz, chunk_ids.json, embeddings_source.json")
 
@@ -1,11 +1,13 @@
 # build_graph.py
+import hashlib
 import json
 import pickle
 import networkx as nx
+from pathlib import Path
 
 # 1) Load data
-with open("all_chunks.json", "r", encoding="utf-8") as f:
-    all_chunks = json.load(f)
+chunks_bytes = Path("all_chunks.json").read_bytes()
+all_chunks = json.loads(chunks_bytes)
 
 # 2) Prepare sets of unique sections, signals, eco tables
 sections = {c["section_id"] for c in all_chunks}
@@ -15,12 +17,12 @@ ecos     = {eco for c in all_chunks for eco in c["eco_ids"]}
 # 3) Build the graph
 G = nx.Graph()
 
-# 3a) Add Section, Signal, ECO_Table nodes
-for sec in sections:
+# 3a) Add Section, Signal, ECO_Table nodes (sorted, so graph.pkl is reproducible)
+for sec in sorted(sections):
     G.add_node(sec, type="Section")
-for sig in signals:
+for sig in sorted(signals):
     G.add_node(sig, type="SystemSignal")
-for eco in ecos:
+for eco in sorted(ecos):
     G.add_node(eco, type="ECO_Table")
 
 # 3b) Add Chunk nodes with attributes, plus edges
@@ -52,5 +54,9 @@ for c in all_chunks:
 with open("graph.pkl", "wb") as f:
     pickle.dump(G, f)
 
-print("Wrote graph.pkl (NetworkX graph)")
+# 5) Record which all_chunks.json it was built from (written last)
+with open("graph_source.json", "w", encoding="utf-8") as f:
+    json.dump({"all_chunks.json": hashlib.sha256(chunks_bytes).hexdigest()}, f)
+
+print("Wrote graph.pkl (NetworkX graph), graph_source.json")
 
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+context_packer.py
+
+Keeps the prompts sent to Ollama within a fixed token budget:
+
+  • estimate_tokens(text)            – cheap token estimate (no tokenizer needed)
+  • conversation_tokens(conversation) – estimate for the serialized prompt, the
+                                       same text ask_ollama() sends and logs
+  • pack_search_results(...)         – highest scoring passages that fit the budget,
+                                       skipping chunks already in the conversation;
+                                       passages are query-biased snippets
+                                       (serve_hybrid.make_snippet)
+  • pack_conversation(conversation)  – compacts older turns until the history fits
+"""
+
+import json
+import re
+from typing import Dict, List, Set
+
+from serve_hybrid import make_snippet
+
+# Rough average for English/technical text with BPE tokenizers
+CHARS_PER_TOKEN = 4
+
+PROMPT_TOKEN_BUDGET = 3000    # whole conversation sent to Ollama
+RESULTS_TOKEN_BUDGET = 1200   # search results added in one follow-up
+PASSAGE_WORDS = 50            # words per snippet window when results carry no "snippet"
+COMPACT_MESSAGE_CHARS = 200   # older messages are cut down to this size
+
+DOCUMENT_PATTERN = re.compile(r"^Document (\S+) \(Score:", re.MULTILINE)
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in a piece of text"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def serialize_conversation(conversation: List[Dict]) -> str:
+    """The prompt sent to Ollama; non-ASCII text (umlauts) is kept as is, not \\u-escaped"""
+    return json.dumps(conversation, ensure_ascii=False)
+
+def conversation_tokens(conversation: List[Dict]) -> int:
+    """Estimate the tokens of a conversation as it is sent to Ollama"""
+    return estimate_tokens(serialize_conversation(conversation))
+
+def chunks_in_conversation(conversation: List[Dict]) -> Set[str]:
+    """Chunk IDs whose passages are already present in the conversation"""
+    seen = set()
+    for message in conversation:
+        seen.update(DOCUMENT_PATTERN.findall(message["content"]))
+    return seen
+
+def pack_search_results(queries: List[str], result_sets: List[List[Dict]],
+                        conversation: List[Dict],
+                        budget: int = RESULTS_TOKEN_BUDGET) -> str:
+    """Format the best passages of several searches within a token budget"""
+    seen = chunks_in_conversation(conversation)
+
+    # Rank every result of every query together, best score first
+    candidates = []
+    for query, results in zip(queries, result_sets):
+        for r in results:
+            candidates.append((r["score"], query, r))
+    candidates.sort(key=lambda c: c[0], reverse=True)
+
+    packed = {query: [] for query in queries}
+    skipped = []
+    used = 0
+    for score, query, r in candidates:
+        if r["chunk_id"] in seen:
+            skipped.append(r["chunk_id"])
+            continue
+        entry = f"\nDocument {r['chunk_id']} (Score: {score:.3f}):\n"
+        entry += f"Section: {r['section_id']}\n"
+        passage = r["snippet"] if "snippet" in r else make_snippet(r["text"], query, PASSAGE_WORDS)
+        entry += f"Text: {passage}\n"
+        entry += f"Related Signals: {', '.join(r['signal_ids'][:5])}\n"
+        cost = estimate_tokens(entry)
+        if used + cost > budget:
+            continue
+        seen.add(r["chunk_id"])
+        packed[query].append(entry)
+        used += cost
+
+    results_text = ""
+    for query in queries:
+        results_text += f"\nSearch Results for '{query}':\n"
+        results_text += "".join(packed[query]) or "No new results.\n"
+    if skipped:
+        results_text += f"\nAlready shown above: {', '.join(sorted(set(skipped)))}\n"
+    return results_text
+
+def compact_message(message: Dict) -> Dict:
+    """Shrink an older message, keeping only a short summary of its content"""
+    content = message["content"]
+    documents = DOCUMENT_PATTERN.findall(content)
+    if documents:
+        # Search results: keep the IDs, drop the passages
+        content = f"Earlier search results: {', '.join(documents)}"
+    elif len(content) > COMPACT_MESSAGE_CHARS:
+        content = content[:COMPACT_MESSAGE_CHARS].rstrip() + "..."
+    return {**message, "content": content}
+
+def pack_conversation(conversation: List[Dict],
+                      budget: int = PROMPT_TOKEN_BUDGET) -> List[Dict]:
+    """Compact older turns, oldest first, until the conversation fits the budget"""
+    system, history = conversation[0], list(conversation[1:])
+
+    # Compact everything but the latest exchange before dropping anything
+    for i in range(max(0, len(history) - 2)):
+        if conversation_tokens([system] + history) <= budget:
+            break
+        history[i] = compact_message(history[i])
+
+    while len(history) > 1 and conversation_tokens([system] + history) > budget:
+        history.pop(0)
+    return [system] + history
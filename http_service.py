@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+http_service.py
+
+Asyncio HTTP front end for serve_hybrid (standard library only).
+
+  • Endpoints:
+      - GET  /search?q=...&top_n=5&fields=snippet,section_id
+      - POST /search        {"query": ..., "top_n": 5, "fields": [...]}
+      - POST /batch_search  {"queries": [...], "top_n": 5, "fields": [...]}
+      - GET  /stats                           latency/counter snapshot (JSON)
+      - GET  /metrics                         same, Prometheus text format
+
+    `fields` selects the result fields (see serve_hybrid.RESULT_FIELDS);
+    without it results carry serve_hybrid.DEFAULT_FIELDS.
+
+  • Connections and request parsing stay on the event loop; scoring and
+    result serialisation run in a bounded thread pool. When more than
+    --max-pending queries are queued (a batch counts once per query) the
+    request is rejected with 503 + Retry-After instead of letting latency
+    grow without bound. Unexpected errors are logged and answered with 500.
+
+  • New index bundles are picked up in the background and swapped in
+    atomically (serve_hybrid.start_index_watcher); SIGTERM stops accepting
+    connections and exits once queued searches have finished.
+
+Usage:
+    python http_service.py --port 8000 --workers 4 --max-pending 64
+    python load_generator.py --url http://127.0.0.1:8000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import serve_hybrid
+
+DEFAULT_TOP_N = 5
+MAX_TOP_N = 50
+MAX_BATCH = 64
+MAX_BODY_BYTES = 1 << 20
+
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+class Overloaded(Exception):
+    """Raised when the search queue is full"""
+
+class BadRequest(Exception):
+    """Raised for malformed or invalid requests"""
+
+def _top_n(value) -> int:
+    try:
+        top_n = int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise BadRequest("top_n must be an integer")
+    return max(1, min(MAX_TOP_N, top_n))
+
+def _encode(payload) -> bytes:
+    return json.dumps(payload).encode("utf-8")
+
+def _fields(value) -> Optional[Tuple[str, ...]]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = [f for f in value.split(",") if f]
+    if not isinstance(value, list) or not all(isinstance(f, str) for f in value):
+        raise BadRequest("fields must be a list of field names")
+    unknown = set(value) - set(serve_hybrid.RESULT_FIELDS)
+    if unknown:
+        raise BadRequest(f"unknown fields {sorted(unknown)}; available: {list(serve_hybrid.RESULT_FIELDS)}")
+    return tuple(value)
+
+def _search_job(query: str, top_n: int, fields) -> bytes:
+    return _encode({"query": query, "results": serve_hybrid.hybrid_search(query, top_n, fields)})
+
+def _batch_search_job(queries: List[str], top_n: int, fields) -> bytes:
+    result_sets = serve_hybrid.hybrid_search_batch(queries, top_n, fields)
+    return _encode({"results": [
+        {"query": q, "results": results} for q, results in zip(queries, result_sets)
+    ]})
+
+class SearchService:
+    """Routes HTTP requests and runs searches in a bounded executor"""
+
+    def __init__(self, workers: int, max_pending: int):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="search")
+        self.max_pending = max_pending
+        self.pending = 0  # queries queued or running; only touched from the event loop thread
+
+    async def run(self, fn, *args, cost: int = 1) -> bytes:
+        """Admit a job of `cost` queries into the executor, or reject it when the queue is full.
+
+        A job larger than max_pending is still admitted when nothing else is
+        pending, so a full-size batch can always run on an idle service.
+        """
+        if self.pending and self.pending + cost > self.max_pending:
+            serve_hybrid.metrics.increment("rejected_requests")
+            raise Overloaded()
+        self.pending += cost
+        serve_hybrid.metrics.set_gauge("pending_searches", self.pending)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= cost
+            serve_hybrid.metrics.set_gauge("pending_searches", self.pending)
+
+    async def dispatch(self, method: str, target: str, body: bytes) -> Tuple[int, str, bytes]:
+        url = urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+
+        if path == "/search":
+            if method == "GET":
+                params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                query, top_n = params.get("q", ""), params.get("top_n", DEFAULT_TOP_N)
+                fields = params.get("fields")
+            elif method == "POST":
+                data = self._json_body(body)
+                query, top_n = data.get("query", ""), data.get("top_n", DEFAULT_TOP_N)
+                fields = data.get("fields")
+            else:
+                return 405, "application/json", _encode({"error": "use GET or POST"})
+            if not isinstance(query, str) or not query.strip():
+                raise BadRequest("missing query")
+            return 200, "application/json", await self.run(_search_job, query.strip(), _top_n(top_n), _fields(fields))
+
+        if path == "/batch_search":
+            if method != "POST":
+                return 405, "application/json", _encode({"error": "use POST"})
+            data = self._json_body(body)
+            queries = data.get("queries")
+            if not isinstance(queries, list) or not queries or not all(isinstance(q, str) for q in queries):
+                raise BadRequest("queries must be a non-empty list of strings")
+            if len(queries) > MAX_BATCH:
+                raise BadRequest(f"at most {MAX_BATCH} queries per batch")
+            top_n, fields = _top_n(data.get("top_n", DEFAULT_TOP_N)), _fields(data.get("fields"))
+            return 200, "application/json", await self.run(_batch_search_job, queries, top_n, fields,
+                                                           cost=len(queries))
+
+        if path == "/stats" and method == "GET":
+            return 200, "application/json", serve_hybrid.metrics.to_json().encode("utf-8")
+
+        if path == "/metrics" and method == "GET":
+            return 200, "text/plain; version=0.0.4", serve_hybrid.metrics.to_prometheus().encode("utf-8")
+
+        return 404, "application/json", _encode({"error": f"no route for {method} {path}"})
+
+    @staticmethod
+    def _json_body(body: bytes) -> Dict:
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            raise BadRequest("body is not valid JSON")
+        if not isinstance(data, dict):
+            raise BadRequest("body must be a JSON object")
+        return data
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve HTTP/1.1 requests (with keep-alive) on one connection"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                extra_headers = []
+                if length > MAX_BODY_BYTES:
+                    status, content_type, payload = 413, "application/json", _encode({"error": "body too large"})
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                    try:
+                        status, content_type, payload = await self.dispatch(method, target, body)
+                    except BadRequest as e:
+                        status, content_type, payload = 400, "application/json", _encode({"error": str(e)})
+                    except Overloaded:
+                        status, content_type, payload = 503, "application/json", _encode({"error": "overloaded"})
+                        extra_headers.append("Retry-After: 1")
+                    except Exception:
+                        serve_hybrid.metrics.increment("server_errors")
+                        print(f"Error handling {method} {target}:", file=sys.stderr)
+                        traceback.print_exc()
+                        status, content_type, payload = 500, "application/json", _encode({"error": "internal error"})
+
+                head = [
+                    f"HTTP/1.1 {status} {STATUS_TEXT[status]}",
+                    f"Content-Type: {content_type}",
+                    f"Content-Length: {len(payload)}",
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}",
+                    *extra_headers,
+                ]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+async def serve(host: str, port: int, workers: int, max_pending: int, sock=None):
+    """Run the service; with `sock`, accept on an already-listening socket"""
+    service = SearchService(workers, max_pending)
+    if sock is not None:
+        server = await asyncio.start_server(service.handle_connection, sock=sock)
+    else:
+        server = await asyncio.start_server(service.handle_connection, host, port)
+        print(f"Hybrid search HTTP service on http://{host}:{port} "
+              f"({workers} search workers, max {max_pending} pending)")
+
+    # On SIGTERM stop accepting connections and let queued searches finish
+    stop = asyncio.Event()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    except (NotImplementedError, RuntimeError):
+        pass
+    await stop.wait()
+    server.close()
+    while service.pending:
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.1)  # let the last responses be written
+
+def main():
+    parser = argparse.ArgumentParser(description="Asyncio HTTP service for hybrid search")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="threads running searches (default: CPU count)")
+    parser.add_argument("--max-pending", type=int, default=64,
+                        help="queries queued or running before requests get 503 (default: 64)")
+    parser.add_argument("--reload-interval", type=float, default=5.0,
+                        help="seconds between checks for a new index bundle, 0 to disable (default: 5)")
+    args = parser.parse_args()
+    if args.reload_interval:
+        serve_hybrid.start_index_watcher(args.reload_interval)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.max_pending))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+index_bundle.py
+
+Versioned single-file index bundles.
+
+  • A bundle is an uncompressed zip holding the four index artifacts
+    (graph.pkl, vectorizer.pkl, chunk_embeddings_sparse.npz, chunk_ids.json)
+    plus manifest.json with the bundle version, SHA-256 and size of every
+    artifact, and the chunk/feature counts they must agree on.
+  • The version is a digest of the artifact contents, so rebuilding
+    identical artifacts gives the same version; the build time is only in
+    the file name and the manifest's "created".
+  • Bundles are written to a temporary file and renamed into place, and
+    index_bundles/CURRENT (the name of the live bundle) is replaced the
+    same way, so readers never see a half-written index.
+  • read_bundle() checks that the manifest lists exactly INDEX_ARTIFACTS
+    and verifies every checksum before anything is unpickled.
+"""
+
+import hashlib
+import io
+import json
+import os
+import time
+import zipfile
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+BUNDLE_FORMAT = 1
+INDEX_ARTIFACTS = ("graph.pkl", "vectorizer.pkl", "chunk_embeddings_sparse.npz", "chunk_ids.json")
+BUNDLE_DIR = Path("index_bundles")
+CURRENT_POINTER = "CURRENT"
+MANIFEST = "manifest.json"
+KEEP_BUNDLES = 3
+
+class BundleError(Exception):
+    """Raised when a bundle is missing, malformed or fails its checksums"""
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def _atomic_write(path: Path, data: bytes):
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def write_bundle(artifacts: Dict[str, bytes], counts: Dict[str, int],
+                 bundle_dir: Path = BUNDLE_DIR, source: Optional[Dict] = None) -> Path:
+    """Write a bundle from artifact bytes and make it the current one"""
+    digest = hashlib.sha256()
+    for name in sorted(artifacts):
+        digest.update(name.encode("utf-8"))
+        digest.update(_sha256(artifacts[name]).encode("ascii"))
+    version = digest.hexdigest()[:16]
+
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "version": version,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "counts": counts,
+        "source": source or {},
+        "artifacts": {
+            name: {"sha256": _sha256(data), "size": len(data)} for name, data in artifacts.items()
+        },
+    }
+
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_STORED) as zf:
+        zf.writestr(MANIFEST, json.dumps(manifest, indent=2))
+        for name, data in artifacts.items():
+            zf.writestr(name, data)
+
+    bundle_dir.mkdir(parents=True, exist_ok=True)
+    path = bundle_dir / f"index-{time.strftime('%Y%m%d-%H%M%S')}-{version}.bundle"
+    _atomic_write(path, buf.getvalue())
+    _atomic_write(bundle_dir / CURRENT_POINTER, (path.name + "\n").encode("utf-8"))
+    prune_bundles(bundle_dir)
+    return path
+
+def read_manifest(path: Path) -> Dict:
+    """Return only the manifest of a bundle (cheap; no artifact is read)"""
+    try:
+        with zipfile.ZipFile(path, "r") as zf:
+            return json.loads(zf.read(MANIFEST))
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+        raise BundleError(f"{path}: cannot read manifest ({e})")
+
+def read_bundle(path: Path) -> Tuple[Dict, Dict[str, bytes]]:
+    """Return (manifest, artifact bytes) after verifying every checksum"""
+    try:
+        with zipfile.ZipFile(path, "r") as zf:
+            manifest = json.loads(zf.read(MANIFEST))
+            if manifest.get("format") != BUNDLE_FORMAT:
+                raise BundleError(f"{path}: unsupported bundle format {manifest.get('format')}")
+            if set(manifest["artifacts"]) != set(INDEX_ARTIFACTS):
+                raise BundleError(f"{path}: manifest lists {sorted(manifest['artifacts'])}, "
+                                  f"expected {sorted(INDEX_ARTIFACTS)}")
+            artifacts = {}
+            for name, meta in manifest["artifacts"].items():
+                data = zf.read(name)
+                if len(data) != meta["size"] or _sha256(data) != meta["sha256"]:
+                    raise BundleError(f"{path}: checksum mismatch for {name}")
+                artifacts[name] = data
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+        raise BundleError(f"{path}: cannot read bundle ({e})")
+    return manifest, artifacts
+
+def current_bundle(bundle_dir: Path = BUNDLE_DIR) -> Optional[Path]:
+    """Path of the live bundle, or None when no bundle has been built"""
+    try:
+        name = (bundle_dir / CURRENT_POINTER).read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+    return bundle_dir / name if name else None
+
+def prune_bundles(bundle_dir: Path = BUNDLE_DIR, keep: int = KEEP_BUNDLES):
+    """Delete all but the newest `keep` bundles (never the current one)"""
+    current = current_bundle(bundle_dir)
+    bundles = sorted(bundle_dir.glob("index-*.bundle"), reverse=True)
+    for path in bundles[keep:]:
+        if current is None or path.name != current.name:
+            path.unlink(missing_ok=True)
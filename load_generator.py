@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+load_generator.py
+
+Closed-loop load generator for http_service.py (standard library only).
+
+For each concurrency level it opens that many keep-alive connections, each
+sending GET /search requests back to back for --duration seconds, and reports
+throughput, p50/p95/p99 latency and the number of rejected (503) requests.
+
+Usage:
+    python load_generator.py --url http://127.0.0.1:8000 --concurrency 1 2 4 8 16 32
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from urllib.parse import quote, urlsplit
+
+# Queries in the style of the hybrid_poc.py test set
+DEFAULT_QUERIES = [
+    "clear service indicator",
+    "cold engine start fuel enrichment",
+    "adjust AFR target",
+    "oil change reminder",
+    "boost limit prevention",
+    "ignition advance low rpm",
+    "LV_OIL_CHG_CAN reset",
+    "fuel trim calibration map",
+]
+
+async def read_response(reader: asyncio.StreamReader) -> int:
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed by server")
+    status = int(status_line.split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+async def client(host, port, queries, top_n, deadline, latencies, counts):
+    rng = random.Random()
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            query = rng.choice(queries)
+            request = (f"GET /search?q={quote(query)}&top_n={top_n} HTTP/1.1\r\n"
+                       f"Host: {host}\r\n\r\n")
+            start = time.perf_counter_ns()
+            writer.write(request.encode("latin-1"))
+            await writer.drain()
+            status = await read_response(reader)
+            if status == 200:
+                latencies.append(time.perf_counter_ns() - start)
+                counts["ok"] += 1
+            elif status == 503:
+                counts["rejected"] += 1
+                await asyncio.sleep(0.01)
+            else:
+                counts["errors"] += 1
+    except (ConnectionError, asyncio.IncompleteReadError):
+        counts["errors"] += 1
+    finally:
+        writer.close()
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))] / 1e6
+
+async def run_level(host, port, queries, top_n, concurrency, duration):
+    latencies, counts = [], {"ok": 0, "rejected": 0, "errors": 0}
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*[
+        client(host, port, queries, top_n, deadline, latencies, counts) for _ in range(concurrency)
+    ])
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": counts["ok"],
+        "rejected": counts["rejected"],
+        "errors": counts["errors"],
+        "throughput_rps": counts["ok"] / elapsed,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+    }
+
+async def run(args):
+    url = urlsplit(args.url)
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = json.load(f)
+
+    print(f"{'conc':>5} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ok':>7} {'503':>6} {'err':>5}")
+    report = []
+    for concurrency in args.concurrency:
+        r = await run_level(url.hostname, url.port or 80, queries, args.top_n, concurrency, args.duration)
+        report.append(r)
+        print(f"{r['concurrency']:>5} {r['throughput_rps']:>9.1f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+              f"{r['p99_ms']:>8.2f} {r['requests']:>7} {r['rejected']:>6} {r['errors']:>5}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for http_service.py")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per concurrency level")
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--queries", help="JSON file with a list of query strings")
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,22 @@
 #!/usr/bin/env python3
-from serve_hybrid import semantic_search, hybrid_search, print_timing_report
+from serve_hybrid import semantic_search, hybrid_search, hybrid_search_batch, print_timing_report
+from answer_cache import AnswerCache
+from context_packer import conversation_tokens, pack_conversation, pack_search_results, serialize_conversation
 import requests
-import json
+import re
 import sys
 
+SEARCH_PATTERN = re.compile(r"\[SEARCH\](.*?)\[/SEARCH\]", re.DOTALL)
+# Punctuation and joining words left at the edges of text around a removed directive
+DANGLING_JOINER = re.compile(r"^(?:[\s,;:]|\b(?:and|or|then|also)\b)+|(?:[\s,;:]|\b(?:and|or|then|also)\b)+$",
+                             re.IGNORECASE)
+MAX_SEARCH_ROUNDS = 3
+
+# Only what the prompt and the fallback output use; no full page text
+RESULT_FIELDS = ("snippet", "section_id", "signal_ids")
+
 def query_ollama(prompt, model="qwen3:4b"):
-    """Query Ollama with given prompt"""
+    """Query Ollama with given prompt; returns None when the request fails"""
     print("Sending request to Ollama...", file=sys.stderr)
     try:
         # Add specific instructions to avoid thinking process
@@ -28,9 +39,12 @@ def query_ollama(prompt, model="qwen3:4b"):
         print("Got response from Ollama", file=sys.stderr)
         if response.status_code != 200:
             print(f"Error: Ollama returned status code {response.status_code}", file=sys.stderr)
-            return f"Error: Could not process request. Falling back to direct search.\n\n[SEARCH]{prompt.split('"content": "')[-1].split('"')[0]}[/SEARCH]"
+            return None
             
-        response_text = response.json()['response']
+        payload = response.json()
+        response_text = payload['response']
+        if "prompt_eval_count" in payload:
+            print(f"Prompt tokens (Ollama): {payload['prompt_eval_count']}", file=sys.stderr)
         
         # Additional cleaning of common issues
         response_text = response_text.replace("<think>", "").replace("</think>", "")
@@ -41,13 +55,13 @@ def query_ollama(prompt, model="qwen3:4b"):
         
     except requests.exceptions.Timeout:
         print("Error: Ollama request timed out", file=sys.stderr)
-        return f"Timeout error. Falling back to direct search.\n\n[SEARCH]{prompt.split('"content": "')[-1].split('"')[0]}[/SEARCH]"
+        return None
     except requests.exceptions.ConnectionError:
-        print("Error: Could not connect to Ollama. Is it running?", file=sys.stderr)
-        return "Error: Could not connect to Ollama. Please make sure it's running on localhost:11434"
+        print("Error: Could not connect to Ollama. Please make sure it's running on localhost:11434", file=sys.stderr)
+        return None
     except Exception as e:
         print(f"Error querying Ollama: {str(e)}", file=sys.stderr)
-        return f"Error: {str(e)}. Falling back to direct search.\n\n[SEARCH]{prompt.split('"content": "')[-1].split('"')[0]}[/SEARCH]"
+        return None
 
 def create_system_prompt():
     return """You are a technical documentation expert for automotive systems. Your task is to:
@@ -98,6 +112,48 @@ def clean_response(response):
     
     return response.strip()
 
+def extract_search_queries(response):
+    """Return every [SEARCH] query in the response, in order and without duplicates"""
+    queries = []
+    for match in SEARCH_PATTERN.finditer(response):
+        query = match.group(1).strip()
+        if query and query not in queries:
+            queries.append(query)
+    return queries
+
+def strip_search_directives(response):
+    """Remove all [SEARCH] ... [/SEARCH] blocks and the joining words they leave behind"""
+    marker = "\x00"
+    lines = []
+    for line in SEARCH_PATTERN.sub(marker, response).split("\n"):
+        if marker in line:
+            fragments = (DANGLING_JOINER.sub("", f) for f in line.split(marker))
+            line = " ".join(f for f in fragments if f)
+        line = " ".join(line.split()) if line.strip() else ""
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    return "\n".join(lines).strip()
+
+def run_searches(queries, top_n=5):
+    """Run all queries as one batch search, preserving query order"""
+    return hybrid_search_batch(queries, top_n, RESULT_FIELDS)
+
+def print_direct_results(query, header="Here are the relevant results:"):
+    """Fallback when there is no LLM answer: show the search results directly"""
+    results = hybrid_search(query, fields=RESULT_FIELDS)
+    print(f"\n{header}")
+    for r in results:
+        print(f"\nSection: {r['section_id']}")
+        print(f"Text: {r['snippet']}")
+        if r['signal_ids']:
+            print(f"Related Signals: {', '.join(r['signal_ids'][:5])}")
+
+def ask_ollama(conversation):
+    """Pack the conversation into the prompt token budget and send it to Ollama (None on failure)"""
+    conversation[:] = pack_conversation(conversation)
+    print(f"Prompt tokens (est.): {conversation_tokens(conversation)}", file=sys.stderr)
+    return query_ollama(serialize_conversation(conversation))
+
 def main():
     print("\nAutomotive Technical Documentation Assistant")
     print("-------------------------------------------")
@@ -105,94 +161,100 @@ def main():
     
     # Initialize conversation with system prompt
     conversation = [{"role": "system", "content": create_system_prompt()}]
+    answer_cache = AnswerCache()
     
     while True:
         user_input = input("\nYou: ").strip()
         if user_input.lower() in ['quit', 'exit', 'q']:
             break
             
-        # Keep conversation history manageable
-        if len(conversation) > 6:
-            conversation = [
-                conversation[0],  # System prompt
-                conversation[-2],  # Last user message
-                conversation[-1]  # Last assistant message
-            ]
-        
+        # The previous user turn is part of the cache key: follow-ups depend on it
+        previous_question = next(
+            (m["content"] for m in reversed(conversation) if m["role"] == "user"), ""
+        )
+
         # Add user query to conversation
         conversation.append({"role": "user", "content": user_input})
         
         print("\nProcessing your question...", file=sys.stderr)
         
+        llm_calls = 0
         try:
+            # Answer repeated or paraphrased questions from the cache
+            retrieved_ids = [r["chunk_id"] for r in semantic_search(user_input, fields=())]
+            cached = answer_cache.lookup(user_input, retrieved_ids, previous_question)
+            if cached is not None:
+                print("Answer served from cache", file=sys.stderr)
+                conversation.append({"role": "assistant", "content": cached})
+                print("\nAssistant:", cached)
+                continue
+
             # Get Ollama's initial response
-            response = query_ollama(json.dumps(conversation))
+            response = ask_ollama(conversation)
+            llm_calls += 1
             if not response or response.isspace():
-                # If we get an empty response, fall back to direct search
-                print("Got empty response, falling back to direct search", file=sys.stderr)
-                results = hybrid_search(user_input)
-                print("\nHere are the relevant results:")
-                for r in results:
-                    print(f"\nSection: {r['section_id']}")
-                    print(f"Text: {r['text'][:300]}...")
-                    if r['signal_ids']:
-                        print(f"Related Signals: {', '.join(r['signal_ids'][:5])}")
+                # If Ollama failed or sent nothing, fall back to direct search
+                print("No response from Ollama, falling back to direct search", file=sys.stderr)
+                print_direct_results(user_input)
                 continue
                 
             response = clean_response(response)
             print("Initial response received", file=sys.stderr)
             
-            # Process any search requests
-            while "[SEARCH]" in response:
-                start = response.find("[SEARCH]") + 8
-                end = response.find("[/SEARCH]")
-                if end == -1:
+            # Process all search requests of a turn in one batch
+            search_rounds = 0
+            while "[/SEARCH]" in response and search_rounds < MAX_SEARCH_ROUNDS:
+                queries = extract_search_queries(response)
+                if not queries:
                     break
-                    
-                search_query = response[start:end].strip()
-                print(f"\nSearching for: {search_query}")
-                
-                # Perform search and get results
-                results = hybrid_search(search_query)
-                
-                # Format results for Ollama
-                results_text = "\nSearch Results:\n"
-                for r in results:
-                    results_text += f"\nDocument {r['chunk_id']} (Score: {r['score']:.3f}):\n"
-                    results_text += f"Section: {r['section_id']}\n"
-                    results_text += f"Text: {r['text'][:300]}...\n"
-                    results_text += f"Related Signals: {', '.join(r['signal_ids'][:5])}\n"
-                
-                # Add search results to conversation
-                conversation.append({"role": "assistant", "content": response[:start-8]})
+                search_rounds += 1
+
+                for search_query in queries:
+                    print(f"\nSearching for: {search_query}")
+
+                # Run every search in one batch and send all results back at once
+                result_sets = run_searches(queries)
+                results_text = pack_search_results(queries, result_sets, conversation)
+
+                # Add search results to conversation; name the searches so the
+                # model can match each result block to the query it asked for
+                searched = f"Searched: {'; '.join(queries)}"
+                prose = strip_search_directives(response)
+                conversation.append({"role": "assistant", "content": f"{prose}\n{searched}" if prose else searched})
                 conversation.append({"role": "system", "content": results_text})
-                
+
                 # Get next response from Ollama
                 print("Getting next response from Ollama...", file=sys.stderr)
-                response = query_ollama(json.dumps(conversation))
-                if not response or response.isspace():
+                response = ask_ollama(conversation)
+                llm_calls += 1
+                if response is None:
+                    break
+                if response.isspace() or not response:
                     print("Got empty follow-up response", file=sys.stderr)
                     break
                 response = clean_response(response)
-                response = response[end + 9:].strip()
-            
-            # Add final response to conversation
+
+            if response is None:
+                # A follow-up call failed: show the results instead of a partial answer
+                print("Ollama failed during follow-up, falling back to direct search", file=sys.stderr)
+                print_direct_results(user_input)
+                continue
+
+            response = strip_search_directives(response)
+
+            # Add final response to conversation; only complete answers are cached
             if response and not response.isspace():
                 conversation.append({"role": "assistant", "content": response})
+                answer_cache.store(user_input, retrieved_ids, response, previous_question)
                 print("\nAssistant:", response)
             
         except Exception as e:
             print(f"\nError during processing: {str(e)}", file=sys.stderr)
             # Fallback to direct search
-            results = hybrid_search(user_input)
-            print("\nHere are the most relevant results:")
-            for r in results:
-                print(f"\nSection: {r['section_id']}")
-                print(f"Text: {r['text'][:300]}...")
-                if r['signal_ids']:
-                    print(f"Related Signals: {', '.join(r['signal_ids'][:5])}")
-        
-        print_timing_report()
+            print_direct_results(user_input, "Here are the most relevant results:")
+        finally:
+            print(f"LLM round trips for this question: {llm_calls}", file=sys.stderr)
+            print_timing_report()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+pipeline.py
+
+Incremental build of the search artifacts (replaces the fixed sequence in poc.sh).
+
+  • Stages form a DAG:
+
+        extract_json ─▶ build_chunks ─┬─▶ build_embeddings ─┬─▶ build_bundle
+                                      └─▶ build_graph ──────┘
+
+  • Each stage is fingerprinted by its script and its inputs. A stage is
+    skipped when neither changed since its last successful run and its
+    outputs are still the ones it wrote. Files are fingerprinted by content
+    (sha256), so an unchanged all_chunks.json also skips everything
+    downstream. Directories are fingerprinted by file names, sizes and mtimes.
+  • Stages whose dependencies are done run concurrently (embeddings and
+    graph only depend on all_chunks.json).
+  • Each build writes pipeline_report.json with per-stage status, wall time
+    and throughput.
+
+Usage:
+    python pipeline.py              # build what is stale
+    python pipeline.py --dry-run    # show what would run
+    python pipeline.py --force      # rebuild everything
+"""
+
+import argparse
+import hashlib
+import json
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, List, Optional
+
+REPO_DIR = Path(__file__).resolve().parent
+STATE_FILE = Path(".pipeline_state.json")
+REPORT_FILE = Path("pipeline_report.json")
+
+# name -> script, inputs, outputs, dependencies (paths relative to the working directory)
+STAGES = {
+    "extract_json": {
+        "script": "extract_json.py",
+        "inputs": ["Funktionsrahmen-Simos-18.1.pdf"],
+        "outputs": ["data/pdf_extracted"],
+        "deps": [],
+    },
+    "build_chunks": {
+        "script": "build_chunks.py",
+        "inputs": ["data/pdf_extracted"],
+        "outputs": ["all_chunks.json"],
+        "deps": ["extract_json"],
+    },
+    "build_embeddings": {
+        "script": "build_embeddings.py",
+        "inputs": ["all_chunks.json"],
+        "outputs": ["vectorizer.pkl", "chunk_embeddings_sparse.npz", "chunk_ids.json", "embeddings_source.json"],
+        "deps": ["build_chunks"],
+    },
+    "build_graph": {
+        "script": "build_graph.py",
+        "inputs": ["all_chunks.json"],
+        "outputs": ["graph.pkl", "graph_source.json"],
+        "deps": ["build_chunks"],
+    },
+    "build_bundle": {
+        "script": "build_bundle.py",
+        "inputs": ["graph.pkl", "vectorizer.pkl", "chunk_embeddings_sparse.npz", "chunk_ids.json",
+                   "embeddings_source.json", "graph_source.json"],
+        "outputs": ["index_bundles/CURRENT"],
+        "deps": ["build_embeddings", "build_graph"],
+    },
+}
+
+def _hash_file(path: Path, h) -> None:
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+
+def fingerprint(paths: List[str]) -> Optional[str]:
+    """Fingerprint of files (content) and directories (names, sizes, mtimes); None if any is missing"""
+    h = hashlib.sha256()
+    for name in paths:
+        path = Path(name)
+        h.update(name.encode("utf-8"))
+        if path.is_file():
+            _hash_file(path, h)
+        elif path.is_dir():
+            for entry in sorted(p for p in path.rglob("*") if p.is_file()):
+                st = entry.stat()
+                h.update(f"{entry.relative_to(path)}:{st.st_size}:{st.st_mtime_ns}".encode("utf-8"))
+        else:
+            return None
+    return h.hexdigest()
+
+def input_fingerprint(stage: Dict) -> Optional[str]:
+    inputs = fingerprint(stage["inputs"])
+    if inputs is None:
+        return None
+    h = hashlib.sha256(inputs.encode("ascii"))
+    _hash_file(REPO_DIR / stage["script"], h)
+    return h.hexdigest()
+
+def size_of(paths: List[str]) -> int:
+    total = 0
+    for name in paths:
+        path = Path(name)
+        if path.is_file():
+            total += path.stat().st_size
+        elif path.is_dir():
+            total += sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+    return total
+
+def count_chunks() -> Optional[int]:
+    try:
+        with open("all_chunks.json", "r", encoding="utf-8") as f:
+            return len(json.load(f))
+    except (OSError, ValueError):
+        return None
+
+def load_state() -> Dict:
+    try:
+        return json.loads(STATE_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+def save_state(state: Dict):
+    tmp = STATE_FILE.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, indent=2), encoding="utf-8")
+    tmp.replace(STATE_FILE)
+
+def plan_stage(name: str, state: Dict, force: bool):
+    """Return (action, reason, input fingerprint) for a stage whose deps are done"""
+    stage = STAGES[name]
+    inputs = input_fingerprint(stage)
+    outputs = fingerprint(stage["outputs"])
+    if inputs is None:
+        if outputs is not None:
+            return "skip", "inputs missing, using existing outputs", None
+        return "fail", f"missing inputs {stage['inputs']}", None
+    if force:
+        return "run", "forced", inputs
+    previous = state.get(name, {})
+    if outputs is None:
+        return "run", "outputs missing", inputs
+    if previous.get("inputs") != inputs:
+        return "run", "inputs or script changed", inputs
+    if previous.get("outputs") != outputs:
+        return "run", "outputs modified since last build", inputs
+    return "skip", "up to date", inputs
+
+def run_stage(name: str) -> Dict:
+    stage = STAGES[name]
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, str(REPO_DIR / stage["script"])],
+                          capture_output=True, text=True)
+    return {
+        "seconds": time.perf_counter() - start,
+        "returncode": proc.returncode,
+        "output": (proc.stdout + proc.stderr).strip(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental build of the search artifacts")
+    parser.add_argument("--force", action="store_true", help="rebuild every stage")
+    parser.add_argument("--dry-run", action="store_true", help="only print what would run")
+    parser.add_argument("--jobs", type=int, default=2, help="stages run concurrently (default: 2)")
+    args = parser.parse_args()
+
+    state = load_state()
+    report = {"started": time.strftime("%Y-%m-%dT%H:%M:%S"), "stages": {}}
+    done, failed, running = set(), set(), {}
+    would_run = set()
+    chunk_count = None
+    build_start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        while len(done) + len(failed) < len(STAGES):
+            for name, stage in STAGES.items():
+                if name in done or name in failed or name in running.values():
+                    continue
+                if any(dep in failed for dep in stage["deps"]):
+                    failed.add(name)
+                    report["stages"][name] = {"status": "blocked", "reason": "dependency failed"}
+                    print(f"[{name}] blocked: dependency failed")
+                    continue
+                if not all(dep in done for dep in stage["deps"]):
+                    continue
+
+                if any(dep in would_run for dep in stage["deps"]):
+                    action, reason, inputs = "run", "dependency will be rebuilt", None
+                else:
+                    action, reason, inputs = plan_stage(name, state, args.force)
+                if action == "fail":
+                    failed.add(name)
+                    report["stages"][name] = {"status": "failed", "reason": reason}
+                    print(f"[{name}] failed: {reason}")
+                elif action == "skip" or args.dry_run:
+                    done.add(name)
+                    status = "would run" if action == "run" else "skipped"
+                    if action == "run":
+                        would_run.add(name)
+                    report["stages"][name] = {"status": status, "reason": reason}
+                    print(f"[{name}] {status}: {reason}")
+                else:
+                    print(f"[{name}] running: {reason}")
+                    report["stages"][name] = {"inputs": inputs, "reason": reason,
+                                              "input_bytes": size_of(stage["inputs"])}
+                    running[pool.submit(run_stage, name)] = name
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                result = future.result()
+                entry = report["stages"][name]
+                inputs = entry.pop("inputs")
+                entry["seconds"] = round(result["seconds"], 3)
+                if result["returncode"] != 0:
+                    failed.add(name)
+                    entry["status"] = "failed"
+                    print(f"[{name}] failed after {result['seconds']:.2f}s:\n{result['output']}")
+                    continue
+
+                done.add(name)
+                entry["status"] = "ran"
+                entry["output_bytes"] = size_of(STAGES[name]["outputs"])
+                entry["input_mb_per_second"] = round(entry["input_bytes"] / 1e6 / max(result["seconds"], 1e-9), 3)
+                if name != "extract_json":
+                    if chunk_count is None or name == "build_chunks":
+                        chunk_count = count_chunks()
+                    if chunk_count is not None:
+                        entry["chunks"] = chunk_count
+                        entry["chunks_per_second"] = round(chunk_count / max(result["seconds"], 1e-9), 1)
+                state[name] = {"inputs": inputs, "outputs": fingerprint(STAGES[name]["outputs"])}
+                save_state(state)
+                print(f"[{name}] done in {result['seconds']:.2f}s")
+
+    report["total_seconds"] = round(time.perf_counter() - build_start, 3)
+    if not args.dry_run:
+        REPORT_FILE.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"\nBuild finished in {report['total_seconds']:.2f}s; wrote {REPORT_FILE}")
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
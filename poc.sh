@@ -1,15 +1,7 @@
-# (1) Extract JSON + images from PDF:
-python extract_json.py
-
-# (2) Build chunk metadata from per-page JSONs:
-python build_chunks.py
-
-# (3) Compute and persist embeddings:
-python build_embeddings.py
-
-# (4) Build and persist the graph:
-python build_graph.py
+# (1)-(4) Extract JSON + images from the PDF, build chunks, embeddings and
+# graph. Only stale stages are rebuilt; embeddings and graph run in parallel.
+# A per-stage timing report is written to pipeline_report.json.
+python pipeline.py || exit 1
 
 # (5) Start the query service:
 python serve_hybrid.py
-
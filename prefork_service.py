@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+prefork_service.py
+
+Pre-fork, multi-process variant of http_service.py (POSIX only).
+
+  • The parent imports serve_hybrid once, so the graph, vectorizer, TF-IDF
+    matrix and chunk IDs are loaded a single time, runs a warm-up query and
+    calls gc.freeze() so the garbage collector never writes to those objects.
+  • It then opens the listening socket and forks N workers. Each worker runs
+    the asyncio service from http_service.py on the inherited socket and
+    reads the index from copy-on-write pages shared with the parent; the
+    CSR arrays of the TF-IDF matrix are never written and stay shared.
+  • When build_bundle.py publishes a new index bundle, the parent loads it,
+    forks a new generation of workers sharing it and sends SIGTERM to the
+    old ones, which stop accepting and exit once their searches finish.
+  • Per-worker RSS / PSS / private memory is printed after start-up and
+    every --report-interval seconds (and exported as gauges on /stats and
+    /metrics): RSS counts the shared index in every worker, PSS divides it
+    between them and private memory is what each worker really adds.
+  • /stats and /metrics are served by whichever worker accepts the
+    connection. Each worker starts its metrics from zero after the fork and
+    labels them with its worker slot and pid, so counters never go
+    backwards within a series; sum over workers for service totals.
+
+Usage:
+    python prefork_service.py --port 8000 --processes 4
+    python load_generator.py --url http://127.0.0.1:8000 --concurrency 1 4 16 64
+"""
+
+import argparse
+import asyncio
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, Optional
+
+import http_service
+import serve_hybrid
+
+MEMORY_FIELDS = {"Rss": "rss_mb", "Pss": "pss_mb", "Private_Clean": "private_mb", "Private_Dirty": "private_mb"}
+
+def memory_usage(pid: int) -> Optional[Dict[str, float]]:
+    """RSS, PSS and private memory (MB) of a process, from /proc/<pid>/smaps_rollup"""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    usage = {"rss_mb": 0.0, "pss_mb": 0.0, "private_mb": 0.0}
+    for line in lines:
+        name, _, value = line.partition(":")
+        if name in MEMORY_FIELDS:
+            usage[MEMORY_FIELDS[name]] += int(value.split()[0]) / 1024
+    return usage
+
+def print_memory_report(workers: Dict[int, int]):
+    print(f"\n{'worker':>6} {'pid':>8} {'RSS MB':>9} {'PSS MB':>9} {'private MB':>11}")
+    parent = memory_usage(os.getpid())
+    if parent:
+        print(f"{'parent':>6} {os.getpid():>8} {parent['rss_mb']:>9.1f} {parent['pss_mb']:>9.1f} "
+              f"{parent['private_mb']:>11.1f}")
+    for pid, index in sorted(workers.items(), key=lambda w: w[1]):
+        usage = memory_usage(pid)
+        if usage:
+            print(f"{index:>6} {pid:>8} {usage['rss_mb']:>9.1f} {usage['pss_mb']:>9.1f} "
+                  f"{usage['private_mb']:>11.1f}")
+    sys.stdout.flush()
+
+async def _export_memory(interval: float):
+    while True:
+        usage = memory_usage(os.getpid())
+        if usage:
+            for name, value in usage.items():
+                serve_hybrid.metrics.set_gauge(f"worker_{name}", round(value, 1))
+        await asyncio.sleep(interval)
+
+async def _worker(sock: socket.socket, threads: int, max_pending: int):
+    exporter = asyncio.get_running_loop().create_task(_export_memory(5.0))
+    try:
+        await http_service.serve(None, None, threads, max_pending, sock=sock)
+    finally:
+        exporter.cancel()
+
+def run_worker(index: int, sock: socket.socket, threads: int, max_pending: int):
+    """Entry point of a forked worker; never returns"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # Drop the counters inherited from the parent (warm-up query, earlier
+    # generations) so this worker only reports its own traffic
+    serve_hybrid.metrics.reset(labels={"worker": str(index), "pid": str(os.getpid())})
+    try:
+        asyncio.run(_worker(sock, threads, max_pending))
+    finally:
+        os._exit(0)
+
+def spawn_worker(index: int, sock: socket.socket, threads: int, max_pending: int) -> int:
+    pid = os.fork()
+    if pid == 0:
+        run_worker(index, sock, threads, max_pending)
+    return pid
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-fork multi-process hybrid search HTTP service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: CPU count)")
+    parser.add_argument("--threads", type=int, default=1,
+                        help="search threads per worker (default: 1)")
+    parser.add_argument("--max-pending", type=int, default=16,
+                        help="queries queued per worker before 503 (default: 16)")
+    parser.add_argument("--report-interval", type=float, default=60.0,
+                        help="seconds between memory reports, 0 to disable (default: 60)")
+    parser.add_argument("--reload-interval", type=float, default=5.0,
+                        help="seconds between checks for a new index bundle, 0 to disable (default: 5)")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        sys.exit("prefork_service.py needs os.fork(); use http_service.py on this platform")
+
+    # Load and warm the index once, then keep the GC away from it so the
+    # pages stay shared between workers
+    serve_hybrid.hybrid_search("warm up")
+    gc.collect()
+    gc.freeze()
+    print(f"Index loaded once in parent (pid {os.getpid()}): {len(serve_hybrid.current_index.chunk_ids)} chunks, "
+          f"version {serve_hybrid.current_index.version}")
+
+    sock = socket.create_server((args.host, args.port), backlog=1024)
+    sock.setblocking(False)
+
+    workers = {}   # pid -> worker slot
+    retiring = set()  # workers of an older index generation, draining
+    for index in range(args.processes):
+        workers[spawn_worker(index, sock, args.threads, args.max_pending)] = index
+    print(f"Hybrid search HTTP service on http://{args.host}:{args.port} "
+          f"({args.processes} processes × {args.threads} threads)")
+
+    stopping = False
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers) + list(retiring):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    time.sleep(1.0)
+    print_memory_report(workers)
+    next_report = time.monotonic() + args.report_interval
+    next_reload = time.monotonic() + args.reload_interval
+
+    # Supervise: replace workers that die, roll over to new index bundles,
+    # report memory periodically
+    while workers or retiring:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            if pid in retiring:
+                retiring.discard(pid)
+                continue
+            index = workers.pop(pid)
+            if not stopping:
+                print(f"Worker {index} (pid {pid}) exited with status {status}; restarting", file=sys.stderr)
+                workers[spawn_worker(index, sock, args.threads, args.max_pending)] = index
+            continue
+        if args.reload_interval and not stopping and time.monotonic() >= next_reload:
+            next_reload = time.monotonic() + args.reload_interval
+            try:
+                reloaded = serve_hybrid.reload_index()
+            except Exception as e:
+                serve_hybrid.metrics.increment("index_reload_errors")
+                print(f"Not swapping index: {e!r}", file=sys.stderr)
+                reloaded = False
+            if reloaded:
+                # Share the new index with a new generation of workers; the old
+                # ones stop accepting, finish their searches and exit
+                gc.collect()
+                gc.freeze()
+                old = workers
+                workers = {spawn_worker(index, sock, args.threads, args.max_pending): index
+                           for index in sorted(old.values())}
+                for pid in old:
+                    retiring.add(pid)
+                    os.kill(pid, signal.SIGTERM)
+                print(f"Swapped in index {serve_hybrid.current_index.version}; "
+                      f"draining {len(old)} old workers")
+        if args.report_interval and time.monotonic() >= next_report:
+            print_memory_report(workers)
+            next_report = time.monotonic() + args.report_interval
+        time.sleep(0.2)
+
+if __name__ == "__main__":
+    main()
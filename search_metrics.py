@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+search_metrics.py
+
+Fixed-memory latency instrumentation for the search service.
+
+  • LatencyHistogram – log-spaced buckets (1µs … ~100s, ~5% resolution),
+                       so memory stays constant however long the service runs
+  • SearchMetrics    – one histogram per stage plus counters and gauges,
+                       exported as a dict, JSON or Prometheus text format;
+                       constant labels (e.g. worker, pid) tag every series
+
+All timings are recorded in nanoseconds (time.perf_counter_ns).
+"""
+
+import json
+import math
+import threading
+from typing import Dict, Iterable, Optional
+
+MIN_NS = 1_000                # 1µs, lowest bucket bound
+GROWTH = 1.05                 # each bucket is 5% wider than the previous one
+NUM_BUCKETS = 380             # MIN_NS * GROWTH**380 ≈ 115s
+QUANTILES = (0.5, 0.95, 0.99)
+
+class LatencyHistogram:
+    """Constant-size latency histogram with approximate percentiles"""
+
+    def __init__(self):
+        self.buckets = [0] * (NUM_BUCKETS + 1)   # last bucket catches overflow
+        self.count = 0
+        self.sum_ns = 0
+        self.min_ns = None
+        self.max_ns = None
+        self.last_ns = None
+
+    def _bucket(self, value_ns: int) -> int:
+        if value_ns <= MIN_NS:
+            return 0
+        return min(NUM_BUCKETS, int(math.log(value_ns / MIN_NS, GROWTH)) + 1)
+
+    def record(self, value_ns: int):
+        self.buckets[self._bucket(value_ns)] += 1
+        self.count += 1
+        self.sum_ns += value_ns
+        self.last_ns = value_ns
+        self.min_ns = value_ns if self.min_ns is None else min(self.min_ns, value_ns)
+        self.max_ns = value_ns if self.max_ns is None else max(self.max_ns, value_ns)
+
+    def percentile(self, q: float) -> float:
+        """Approximate q-quantile in ns (upper bound of the matching bucket)"""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                upper = MIN_NS * GROWTH ** i
+                # Never report outside the observed range
+                return float(min(max(upper, self.min_ns), self.max_ns))
+        return float(self.max_ns)
+
+    def summary(self) -> Dict:
+        """Summary in seconds, matching the shape of get_timing_stats()"""
+        if not self.count:
+            return {"count": 0}
+        stats = {
+            "last": self.last_ns / 1e9,
+            "avg": self.sum_ns / self.count / 1e9,
+            "min": self.min_ns / 1e9,
+            "max": self.max_ns / 1e9,
+            "count": self.count,
+            "total": self.sum_ns / 1e9,
+        }
+        for q in QUANTILES:
+            stats[f"p{int(q * 100)}"] = self.percentile(q) / 1e9
+        return stats
+
+class SearchMetrics:
+    """Per-stage latency histograms, counters and gauges for the search service"""
+
+    def __init__(self, stages: Iterable[str], counters: Iterable[str] = (),
+                 labels: Optional[Dict[str, str]] = None):
+        self._lock = threading.Lock()
+        self.stages = {stage: LatencyHistogram() for stage in stages}
+        self.counters = {name: 0 for name in counters}
+        self.gauges = {}
+        self.labels = dict(labels or {})
+
+    def reset(self, labels: Optional[Dict[str, str]] = None):
+        """Start counting from zero (e.g. in a forked worker); gauges are kept"""
+        with self._lock:
+            self.stages = {stage: LatencyHistogram() for stage in self.stages}
+            self.counters = {name: 0 for name in self.counters}
+            if labels is not None:
+                self.labels = dict(labels)
+
+    def observe(self, stage: str, elapsed_ns: int):
+        with self._lock:
+            if stage not in self.stages:
+                self.stages[stage] = LatencyHistogram()
+            self.stages[stage].record(elapsed_ns)
+
+    def increment(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self.gauges[name] = value
+
+    def snapshot(self) -> Dict:
+        """Stage summaries (seconds), counters and gauges as a plain dict"""
+        with self._lock:
+            return {
+                "stages": {stage: h.summary() for stage, h in self.stages.items() if h.count},
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "labels": dict(self.labels),
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, prefix: str = "gravdb") -> str:
+        """Prometheus text exposition format (stages exported as summaries)"""
+        snap = self.snapshot()
+
+        def labels(**extra) -> str:
+            pairs = {**snap["labels"], **extra}
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs.items()) + "}"
+
+        lines = [
+            f"# HELP {prefix}_stage_seconds Search stage latency.",
+            f"# TYPE {prefix}_stage_seconds summary",
+        ]
+        for stage, stats in snap["stages"].items():
+            for q in QUANTILES:
+                value = stats[f"p{int(q * 100)}"]
+                lines.append(f'{prefix}_stage_seconds{labels(stage=stage, quantile=q)} {value:.9f}')
+            lines.append(f'{prefix}_stage_seconds_sum{labels(stage=stage)} {stats["total"]:.9f}')
+            lines.append(f'{prefix}_stage_seconds_count{labels(stage=stage)} {stats["count"]}')
+        for name, value in snap["counters"].items():
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total{labels()} {value}")
+        for name, value in snap["gauges"].items():
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name}{labels()} {value}")
+        return "\n".join(lines) + "\n"
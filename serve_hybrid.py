@@ -4,131 +4,331 @@ serve_hybrid.py
 
 A self-contained hybrid search service (vector + graph):
 
-  • On startup, it loads:
+  • On startup, it loads the current index bundle (index_bundles/CURRENT,
+    written by build_bundle.py), whose checksums are verified, or else the
+    loose artifacts in the working directory:
       - graph.pkl         (NetworkX graph)
       - vectorizer.pkl    (TF-IDF vectorizer)
       - chunk_embeddings_sparse.npz (Sparse TF-IDF matrix)
       - chunk_ids.json
 
+  • New bundles can be hot-swapped with reload_index() or a background
+    start_index_watcher(); in-flight searches finish on the old index.
+
   • Implements:
-      - semantic_search(query, top_n)
-      - hybrid_search(query, top_n)
+      - semantic_search(query, top_n, fields)
+      - hybrid_search(query, top_n, fields)
+      - semantic_search_batch / hybrid_search_batch(queries, top_n, fields)
+        (one vectorizer pass and one sparse product for all queries;
+        timed under the batch_* stages, one sample per batch)
+      - make_snippet(text, query) (query-biased snippet, also available as
+        the "snippet" result field)
+      - metrics (per-stage p50/p95/p99 latency, result counters; see
+        metrics.to_json() / metrics.to_prometheus())
 
-  • Offers a simple CLI to test queries; you can wrap this into FastAPI/Flask if desired.
+  • Offers a simple CLI to test queries; http_service.py serves it over HTTP.
 """
 
+import io
 import pickle
 import json
+import re
+import sys
+import threading
 import numpy as np
 import networkx as nx
 from scipy import sparse
 from sklearn.metrics.pairwise import cosine_similarity
 import time
-from typing import Dict, List
-
-# Add timing stats dictionary
-timing_stats = {
-    "query_processing": [],
-    "similarity_computation": [],
-    "filtering": [],
-    "result_building": [],
-    "total_search": []
-}
+from pathlib import Path
+from typing import Dict, List, Optional
+from index_bundle import INDEX_ARTIFACTS, current_bundle, read_bundle, read_manifest
+from search_metrics import SearchMetrics
+
+# Fixed-memory timing histograms and counters
+metrics = SearchMetrics(
+    stages=["query_processing", "similarity_computation", "filtering", "result_building", "total_search"],
+    counters=["queries", "batches", "batch_queries", "results_returned", "empty_result_queries",
+              "index_swaps", "index_reload_errors"]
+)
 
 # 1) Load persisted objects
-with open("graph.pkl", "rb") as f:
-    G = pickle.load(f)
+class SearchIndex:
+    """One loaded, immutable version of the index"""
+
+    def __init__(self, G, vectorizer, tfidf_sparse, chunk_ids, version: str, bundle: Optional[str] = None):
+        self.G = G
+        self.vectorizer = vectorizer
+        self.tfidf_sparse = tfidf_sparse  # shape (N_chunks, N_features)
+        self.chunk_ids = chunk_ids
+        self.version = version
+        self.bundle = bundle  # bundle file name, None for loose artifacts
+        # 2) Map chunk_id → index in embeddings array
+        self.chunk_to_index = {cid: idx for idx, cid in enumerate(chunk_ids)}
+
+def _index_from_bytes(artifacts: Dict[str, bytes], version: str, bundle: Optional[str] = None) -> SearchIndex:
+    return SearchIndex(
+        G=pickle.loads(artifacts["graph.pkl"]),
+        vectorizer=pickle.loads(artifacts["vectorizer.pkl"]),
+        tfidf_sparse=sparse.load_npz(io.BytesIO(artifacts["chunk_embeddings_sparse.npz"])),
+        chunk_ids=json.loads(artifacts["chunk_ids.json"]),
+        version=version,
+        bundle=bundle,
+    )
+
+def load_index(bundle_path=None) -> SearchIndex:
+    """Load the current (or given) bundle; fall back to the loose artifacts"""
+    bundle_path = bundle_path or current_bundle()
+    if bundle_path is not None:
+        manifest, artifacts = read_bundle(bundle_path)
+        return _index_from_bytes(artifacts, manifest["version"], Path(bundle_path).name)
+
+    artifacts = {name: Path(name).read_bytes() for name in INDEX_ARTIFACTS}
+    return _index_from_bytes(artifacts, "unbundled")
+
+load_start = time.perf_counter_ns()
+current_index = load_index()
+metrics.set_gauge("data_loading_seconds", (time.perf_counter_ns() - load_start) / 1e9)
+
+# Module-level names kept for callers that read them directly; they follow
+# current_index, but searches only ever use one SearchIndex snapshot
+G = current_index.G
+vectorizer = current_index.vectorizer
+tfidf_sparse = current_index.tfidf_sparse
+chunk_ids = current_index.chunk_ids
+chunk_to_index = current_index.chunk_to_index
+
+_swap_lock = threading.Lock()
+_skipped_bundle = None  # last bundle not swapped in: failed to load, or same version as the live one
+
+def swap_index(index: SearchIndex):
+    """Atomically make `index` the one new searches use.
+
+    Searches already running keep the SearchIndex they started with, so
+    they finish on the old version; it is freed when the last one returns.
+    """
+    global current_index, G, vectorizer, tfidf_sparse, chunk_ids, chunk_to_index
+    with _swap_lock:
+        current_index = index
+        G, vectorizer, tfidf_sparse = index.G, index.vectorizer, index.tfidf_sparse
+        chunk_ids, chunk_to_index = index.chunk_ids, index.chunk_to_index
+        metrics.increment("index_swaps")
+
+def reload_index(bundle_path=None) -> bool:
+    """Load the current bundle and swap it in if it is a new version.
+
+    Only the CURRENT pointer is read when it still names the loaded bundle
+    (or one already skipped), and only the manifest when the new bundle
+    holds the same content (version) as the live index, so polling is cheap.
+    """
+    global _skipped_bundle
+    bundle_path = bundle_path or current_bundle()
+    if bundle_path is None:
+        return False
+    name = Path(bundle_path).name
+    if name == current_index.bundle or name == _skipped_bundle:
+        return False
+    load_start = time.perf_counter_ns()
+    try:
+        if read_manifest(bundle_path).get("version") == current_index.version:
+            _skipped_bundle = name
+            return False
+        index = load_index(bundle_path)
+    except Exception:
+        _skipped_bundle = name
+        raise
+    # Warm the new index up so the first query on it is not slower
+    cosine_similarity(index.vectorizer.transform(["warm up"]), index.tfidf_sparse)
+    swap_index(index)
+    metrics.set_gauge("data_loading_seconds", (time.perf_counter_ns() - load_start) / 1e9)
+    return True
+
+def start_index_watcher(interval: float = 5.0) -> threading.Thread:
+    """Poll index_bundles/CURRENT and hot-swap new bundles in a background thread"""
+    def watch():
+        while True:
+            time.sleep(interval)
+            try:
+                if reload_index():
+                    print(f"Swapped in index {current_index.version}", file=sys.stderr)
+            except Exception as e:
+                # Keep polling: a later bundle may be fine
+                metrics.increment("index_reload_errors")
+                print(f"Not swapping index: {e!r}", file=sys.stderr)
+
+    thread = threading.Thread(target=watch, name="index-watcher", daemon=True)
+    thread.start()
+    return thread
+
+# Result fields; "chunk_id" and "score" are always returned
+DEFAULT_FIELDS = (
+    "text", "section_id", "signal_ids", "eco_ids", "image_paths",
+    "section_neighbors", "signal_neighbors", "eco_neighbors"
+)
+RESULT_FIELDS = DEFAULT_FIELDS + ("snippet",)
+NEIGHBOR_TYPES = {
+    "section_neighbors": "Section",
+    "signal_neighbors": "SystemSignal",
+    "eco_neighbors": "ECO_Table",
+}
+
+SNIPPET_WORDS = 30
+SNIPPET_WINDOWS = 2
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")  # same tokens as the TF-IDF vectorizer
 
-with open("vectorizer.pkl", "rb") as f:
-    vectorizer = pickle.load(f)
+def make_snippet(text: str, query: str, window_words: int = SNIPPET_WORDS,
+                 max_windows: int = SNIPPET_WINDOWS) -> str:
+    """Return the window(s) of `text` with the most query-term occurrences"""
+    query_terms = {t.lower() for t in TOKEN_PATTERN.findall(query)}
+    tokens = list(TOKEN_PATTERN.finditer(text))
+    if len(tokens) <= window_words:
+        return text.strip()
 
-# Load the sparse TF-IDF matrix
-tfidf_sparse = sparse.load_npz("chunk_embeddings_sparse.npz")  # shape (N_chunks, N_features)
+    # Token positions of query terms, then a two-pointer scan for the
+    # densest windows (tokenizing is linear in the page, the scan in the hits)
+    hits = [i for i, m in enumerate(tokens) if m.group().lower() in query_terms]
+    windows = []
+    while hits and len(windows) < max_windows:
+        best_lo, best_hi, lo = 0, 0, 0
+        for hi in range(len(hits)):
+            while hits[hi] - hits[lo] >= window_words:
+                lo += 1
+            if hi - lo > best_hi - best_lo:
+                best_lo, best_hi = lo, hi
+        # Center the matched span in the window for some context
+        slack = window_words - (hits[best_hi] - hits[best_lo] + 1)
+        start = max(0, min(hits[best_lo] - slack // 2, len(tokens) - window_words))
+        windows.append((start, start + window_words))
+        hits = [h for h in hits if not start <= h < start + window_words]
+    if not windows:
+        windows = [(0, window_words)]
 
-with open("chunk_ids.json", "r", encoding="utf-8") as f:
-    chunk_ids = json.load(f)
+    # Merge windows that overlap or touch
+    merged = []
+    for start, end in sorted(windows):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+
+    # One "..." wherever text is left out: before, between and after windows
+    snippet = " ... ".join(text[tokens[start].start():tokens[end - 1].end()] for start, end in merged)
+    prefix = "... " if merged[0][0] > 0 else ""
+    suffix = " ..." if merged[-1][1] < len(tokens) else ""
+    return f"{prefix}{snippet}{suffix}"
 
-# 2) Map chunk_id → index in embeddings array
-chunk_to_index = {cid: idx for idx, cid in enumerate(chunk_ids)}
+def _neighbors_by_type(G, cid: str) -> Dict[str, List[str]]:
+    grouped = {field: [] for field in NEIGHBOR_TYPES}
+    for n in G.neighbors(cid):
+        for field, node_type in NEIGHBOR_TYPES.items():
+            if G.nodes[n]["type"] == node_type:
+                grouped[field].append(n)
+    return grouped
+
+def build_result(index: SearchIndex, cid: str, score: float, query: str, fields) -> Dict:
+    """Build one result with only the requested fields"""
+    node = index.G.nodes[cid]
+    result = {"chunk_id": cid, "score": score}
+    neighbors = None
+    for field in fields:
+        if field == "snippet":
+            result["snippet"] = make_snippet(node["text"], query)
+        elif field in NEIGHBOR_TYPES:
+            if neighbors is None:
+                neighbors = _neighbors_by_type(index.G, cid)
+            result[field] = neighbors[field]
+        else:
+            result[field] = node[field]
+    return result
 
 # 3) Semantic search: top N chunks by vector similarity
-def semantic_search(query: str, top_n: int = 5) -> List[Dict]:
-    search_start = time.time()
+def semantic_search(query: str, top_n: int = 5, fields=None) -> List[Dict]:
+    """Top N chunks by TF-IDF similarity.
+
+    `fields` selects what each result carries besides chunk_id and score
+    (default: DEFAULT_FIELDS; see RESULT_FIELDS for all of them).
+    """
+    return _search([query], top_n, fields, stage_prefix="")[0]
+
+def semantic_search_batch(queries: List[str], top_n: int = 5, fields=None) -> List[List[Dict]]:
+    """semantic_search() for several queries at once, one result list per query.
+
+    All queries are vectorized in one transform() and scored in one sparse
+    product, which is much cheaper than searching them one by one. Batch
+    latencies are recorded under "batch_*" stages (one sample per batch),
+    so the single-query stage histograms stay per query.
+    """
+    return _search(queries, top_n, fields, stage_prefix="batch_")
+
+def _search(queries: List[str], top_n: int, fields, stage_prefix: str) -> List[List[Dict]]:
+    fields = DEFAULT_FIELDS if fields is None else tuple(fields)
+    unknown = set(fields) - set(RESULT_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown result fields: {sorted(unknown)}")
+    if not queries:
+        return []
+
+    search_start = time.perf_counter_ns()
     
-    # 1) Load data if not already loaded
-    load_start = time.time()
-    global G, tfidf_sparse, chunk_ids, vectorizer
-    if 'G' not in globals():
-        load_data()
-    load_time = time.time() - load_start
-    timing_stats["data_loading"] = load_time
+    # 1) Take one index snapshot for the whole search, so a concurrent
+    # swap_index() never mixes two index versions in one query
+    index = current_index
     
-    # 2) Vectorize query
-    vec_start = time.time()
-    q_vec = vectorizer.transform([query])
-    vec_time = time.time() - vec_start
-    timing_stats["query_processing"].append(vec_time)
+    # 2) Vectorize queries
+    vec_start = time.perf_counter_ns()
+    q_vecs = index.vectorizer.transform(queries)
+    metrics.observe(f"{stage_prefix}query_processing", time.perf_counter_ns() - vec_start)
 
     # 3) Compute similarities and rank
-    sim_start = time.time()
-    sims = cosine_similarity(q_vec, tfidf_sparse)[0]
-    sim_time = time.time() - sim_start
-    timing_stats["similarity_computation"].append(sim_time)
+    sim_start = time.perf_counter_ns()
+    sims = cosine_similarity(q_vecs, index.tfidf_sparse)  # shape (N_queries, N_chunks)
+    metrics.observe(f"{stage_prefix}similarity_computation", time.perf_counter_ns() - sim_start)
 
     # Filter and rank results
-    filter_start = time.time()
-    valid_idxs = np.where(sims > 1e-6)[0]
-    valid_sims = sims[valid_idxs]
-    
-    if len(valid_idxs) == 0:
-        ranked_indices = np.array([], dtype=int)
-    else:
-        sorted_valid = valid_idxs[valid_sims.argsort()[::-1]]
-        ranked_indices = sorted_valid[:top_n]
-    filter_time = time.time() - filter_start
-    timing_stats["filtering"].append(filter_time)
+    filter_start = time.perf_counter_ns()
+    ranked = []
+    for row in sims:
+        valid_idxs = np.where(row > 1e-6)[0]
+        valid_sims = row[valid_idxs]
+        
+        if len(valid_idxs) == 0:
+            ranked.append(np.array([], dtype=int))
+        else:
+            sorted_valid = valid_idxs[valid_sims.argsort()[::-1]]
+            ranked.append(sorted_valid[:top_n])
+    metrics.observe(f"{stage_prefix}filtering", time.perf_counter_ns() - filter_start)
 
     # Build results
-    results_start = time.time()
-    results = []
-    for idx in ranked_indices:
-        cid = chunk_ids[idx]
-        node = G.nodes[cid]
-        results.append({
-            "chunk_id": cid,
-            "score": float(sims[idx]),
-            "text": node["text"],
-            "section_id": node["section_id"],
-            "signal_ids": node["signal_ids"],
-            "eco_ids": node["eco_ids"],
-            "image_paths": node["image_paths"],
-            "section_neighbors": list(G.neighbors(cid)),
-            "signal_neighbors": node.get("signal_neighbors", []),
-            "eco_neighbors": node.get("eco_neighbors", [])
-        })
-    results_time = time.time() - results_start
-    timing_stats["result_building"].append(results_time)
-
-    # Total search time
-    total_time = time.time() - search_start
-    timing_stats["total_search"].append(total_time)
-
-    return results
+    results_start = time.perf_counter_ns()
+    batch_results = []
+    for query, row, ranked_indices in zip(queries, sims, ranked):
+        batch_results.append([
+            build_result(index, index.chunk_ids[idx], float(row[idx]), query, fields)
+            for idx in ranked_indices
+        ])
+    metrics.observe(f"{stage_prefix}result_building", time.perf_counter_ns() - results_start)
+
+    # Total search time and result counters
+    # (total_search count == queries, batch_total_search count == batches)
+    metrics.observe(f"{stage_prefix}total_search", time.perf_counter_ns() - search_start)
+    if stage_prefix:
+        metrics.increment("batches")
+        metrics.increment("batch_queries", len(queries))
+    else:
+        metrics.increment("queries")
+    for results in batch_results:
+        metrics.increment("results_returned", len(results))
+        if not results:
+            metrics.increment("empty_result_queries")
+
+    return batch_results
 
 def get_timing_stats() -> Dict:
-    """Return current timing statistics with averages"""
-    stats = {}
-    for key, times in timing_stats.items():
-        if isinstance(times, list) and times:
-            stats[key] = {
-                "last": times[-1],
-                "avg": sum(times) / len(times),
-                "min": min(times),
-                "max": max(times),
-                "count": len(times)
-            }
-        elif isinstance(times, (int, float)):
-            stats[key] = {"value": times}
+    """Return current timing statistics (seconds) with percentiles"""
+    snap = metrics.snapshot()
+    stats = dict(snap["stages"])
+    if "data_loading_seconds" in snap["gauges"]:
+        stats["data_loading"] = {"value": snap["gauges"]["data_loading_seconds"]}
     return stats
 
 def print_timing_report():
@@ -136,39 +336,38 @@ def print_timing_report():
     stats = get_timing_stats()
     print("\nSearch System Timing Report")
     print("-" * 50)
-    for operation, metrics in stats.items():
+    for operation, m in stats.items():
         print(f"\n{operation.replace('_', ' ').title()}:")
-        if "value" in metrics:
-            print(f"  Time: {metrics['value']:.4f}s")
+        if "value" in m:
+            print(f"  Time: {m['value']:.4f}s")
         else:
-            print(f"  Last: {metrics['last']:.4f}s")
-            print(f"  Avg:  {metrics['avg']:.4f}s")
-            print(f"  Min:  {metrics['min']:.4f}s")
-            print(f"  Max:  {metrics['max']:.4f}s")
-            print(f"  Count: {metrics['count']}")
+            print(f"  Last: {m['last']:.4f}s")
+            print(f"  Avg:  {m['avg']:.4f}s")
+            print(f"  p50:  {m['p50']:.4f}s")
+            print(f"  p95:  {m['p95']:.4f}s")
+            print(f"  p99:  {m['p99']:.4f}s")
+            print(f"  Min:  {m['min']:.4f}s")
+            print(f"  Max:  {m['max']:.4f}s")
+            print(f"  Count: {m['count']}")
+    counters = metrics.snapshot()["counters"]
+    print(f"\nQueries: {counters['queries']}, "
+          f"batches: {counters['batches']} ({counters['batch_queries']} queries), "
+          f"results returned: {counters['results_returned']}, "
+          f"empty-result queries: {counters['empty_result_queries']}")
     print("-" * 50)
 
 # 4) Hybrid search: semantic + graph neighbors
-def hybrid_search(query: str, top_n: int = 5):
-    sem_results = semantic_search(query, top_n)
-    hybrid_out = []
-    for entry in sem_results:
-        cid = entry["chunk_id"]
-        neighbors = list(G.neighbors(cid))
-
-        section_neighbors = [n for n in neighbors if G.nodes[n]["type"] == "Section"]
-        signal_neighbors  = [n for n in neighbors if G.nodes[n]["type"] == "SystemSignal"]
-        eco_neighbors     = [n for n in neighbors if G.nodes[n]["type"] == "ECO_Table"]
-
-        hybrid_out.append({
-            **entry,
-            "section_neighbors": section_neighbors,
-            "signal_neighbors":  signal_neighbors,
-            "eco_neighbors":     eco_neighbors
-        })
-    return hybrid_out
+def hybrid_search(query: str, top_n: int = 5, fields=None):
+    """Semantic search whose results carry their graph neighbors by type"""
+    return semantic_search(query, top_n, fields)
+
+def hybrid_search_batch(queries: List[str], top_n: int = 5, fields=None):
+    """hybrid_search() for several queries at once, one result list per query"""
+    return semantic_search_batch(queries, top_n, fields)
 
 # 5) Simple CLI to test queries
+CLI_FIELDS = ("snippet",) + DEFAULT_FIELDS[1:]
+
 if __name__ == "__main__":
     print("Hybrid search service ready. Type a query (or 'quit').")
     while True:
@@ -176,11 +375,11 @@ if __name__ == "__main__":
         if not query or query.lower() in {"quit", "exit"}:
             break
 
-        results = hybrid_search(query, top_n=5)
+        results = hybrid_search(query, top_n=5, fields=CLI_FIELDS)
         print(f"\nTop {len(results)} results for '{query}':")
         for r in results:
             print(f"  • chunk_id: {r['chunk_id']}, score: {r['score']:.3f}")
-            print(f"    text: {r['text']}")
+            print(f"    snippet: {r['snippet']}")
             print(f"    section_id: {r['section_id']}")
             print(f"    signal_ids: {r['signal_ids']}")
             print(f"    eco_ids: {r['eco_ids']}")
@@ -190,14 +389,4 @@ if __name__ == "__main__":
             print(f"    eco_neighbors: {r['eco_neighbors']}\n")
         
         # Print timing report after results
-        print("\nTiming Statistics:")
-        print("-" * 30)
-        stats = get_timing_stats()
-        for operation, metrics in stats.items():
-            print(f"\n{operation.replace('_', ' ').title()}:")
-            if "value" in metrics:
-                print(f"  Time: {metrics['value']:.4f}s")
-            else:
-                print(f"  Last: {metrics['last']:.4f}s")
-                print(f"  Avg:  {metrics['avg']:.4f}s")
-
+        print_timing_report()